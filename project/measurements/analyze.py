@@ -1,78 +1,102 @@
 import re
 import sys
 import os
-import pprint
-import pandas as pd
-
-pp = pprint.PrettyPrinter(depth=4)
-
-def process_oha(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    # Regular expression pattern to find the response time histogram values
-    pattern = r'(\d+\.\d+)\s\[(\d+)\]\s*\|'
-    
-    histogram_values = re.findall(pattern, content)
-    
-   # Calculate the median time from the histogram
-    times = [float(time) for time, _ in histogram_values]
-    counts = [int(count) for _, count in histogram_values]
-    total_counts = sum(counts)
-    median_index = total_counts // 2
-    cumulative_count = 0
-    median_time = None
-
-    for time, count in histogram_values:
-       cumulative_count += int(count)
-       if cumulative_count >= median_index:
-          median_time = float(time)
-          break
-
-
-    slowest_pattern = r'Slowest:\s+(\d+\.\d+)\ssecs'
-    fastest_pattern = r'Fastest:\s+(\d+\.\d+)\ssecs'
-    requests_per_sec_pattern = r'Requests\/sec:\s+(\d+\.\d+)'
-    total_data_pattern = r'Total data:\s+(\d+\.\d+)\s([KMGTP]?i?B)'
-    response_time_25_pattern = r'25%\sin\s(\d+\.\d+)\ssecs'
-    response_time_50_pattern = r'50%\sin\s(\d+\.\d+)\ssecs'
-    response_time_75_pattern = r'75%\sin\s(\d+\.\d+)\ssecs'
-    response_time_90_pattern = r'90%\sin\s(\d+\.\d+)\ssecs'
-    response_time_99_pattern = r'99%\sin\s(\d+\.\d+)\ssecs'
-
-    slowest = float(re.search(slowest_pattern, content).group(1))
-    fastest = float(re.search(fastest_pattern, content).group(1))
-    requests_per_sec = float(re.search(requests_per_sec_pattern, content).group(1))
-    total_data, data_unit = re.search(total_data_pattern, content).groups()
-    response_time_25 = float(re.search(response_time_25_pattern, content).group(1))
-    response_time_50 = float(re.search(response_time_50_pattern, content).group(1))
-    response_time_75 = float(re.search(response_time_75_pattern, content).group(1))
-    response_time_90 = float(re.search(response_time_90_pattern, content).group(1))
-    response_time_99 = float(re.search(response_time_99_pattern, content).group(1))
-
-    total_data = float(total_data)
-    if data_unit.lower() == 'kib':
-        total_data *= 1024
-    elif data_unit.lower() == 'mib':
-        total_data *= 1024 ** 2
-    elif data_unit.lower() == 'gib':
-        total_data *= 1024 ** 3
-    elif data_unit.lower() == 'tib':
-        total_data *= 1024 ** 4
-    elif data_unit.lower() == 'pib':
-        total_data *= 1024 ** 5
+import mmap
+import io
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from pyexcel_ods3 import save_data
+
+# Regular expression patterns for the oha output
+_HIST_RE = re.compile(rb'(\d+\.\d+)\s\[(\d+)\]\s*\|')
+# Summary fields and response time distribution, matched in a single pass
+_OHA_FIELDS_RE = re.compile(
+    rb'Slowest:\s+(?P<slowest>\d+\.\d+)\ssecs'
+    rb'|Fastest:\s+(?P<fastest>\d+\.\d+)\ssecs'
+    rb'|Requests\/sec:\s+(?P<requests_per_sec>\d+\.\d+)'
+    rb'|Total data:\s+(?P<total_data>\d+\.\d+)\s(?P<data_unit>[KMGTP]?i?B)'
+    rb'|(?P<percentile>25|50|75|90|99)%\sin\s(?P<response_time>\d+\.\d+)\ssecs'
+)
+
+# Regular expression patterns for the warp output
+_REQUESTS_CONSIDERED_RE = re.compile(rb'Requests considered:\s+(\d+)')
+_TTFB_LINE_RE = re.compile(rb'TTFB:.+')
+# TTFB percentiles, matched in a single pass over the TTFB line
+_TTFB_RE = re.compile(rb'(Median|Worst|99th|90th|75th|25th|Best): (\d+\.?\d*)\s*(s|ms)')
+_THROUGHPUT_RE = re.compile(rb'Average:\s+(\d+\.\d+)\sMiB/s,\s+(\d+\.\d+)\sobj/s')
+
+# Regular expression pattern for the cumulative values section of the iftop output
+_CUMULATIVE_RE = re.compile(rb'Cumulative \(sent/received/total\):\s*([\d.]+[KMG]?B)\s+([\d.]+[KMG]?B)\s+([\d.]+[KMG]?B)')
+
+# Powers of 1024 of the size suffixes of test names (e.g., "1KiB") and data sizes (e.g., "1KB")
+_TEST_SIZE_UNITS = {
+    'kib': 1,
+    'mib': 2,
+    'gib': 3,
+    'tib': 4,
+    'pib': 5,
+}
+_DATA_SIZE_UNITS = {
+    'kb': 1,
+    'mb': 2,
+    'gb': 3,
+    'tb': 4,
+    'pb': 5,
+}
+_SIZE_MULTIPLIERS = tuple(1024 ** unit_idx for unit_idx in range(6))
+_SIZE_VALUE_CHARS = frozenset('0123456789.')
+
+# Sort order and name of the types of output files
+_FILE_TYPES = {
+    "warp": (1, "warp"),
+    "iftop-warp": (2, "iftop-warp"),
+    "oha": (3, "oha"),
+    "iftop-oha": (4, "iftop-oha"),
+}
+
+def process_oha(content, file_path, out=None):
+    # Find the response time histogram values
+    histogram_values = _HIST_RE.findall(content)
+
+    # Keep the first occurrence of every field
+    fields = {}
+    for match in _OHA_FIELDS_RE.finditer(content):
+        field = match.lastgroup
+        if field == 'response_time':
+            field = f"response_time_{match.group('percentile').decode()}"
+        elif field == 'data_unit':
+            field = 'total_data'
+        fields.setdefault(field, match.groupdict())
+
+    # Count the total number of requests from the histogram
+    total_counts = sum(int(count) for _, count in histogram_values)
+
+    slowest = float(fields['slowest']['slowest'])
+    fastest = float(fields['fastest']['fastest'])
+    requests_per_sec = float(fields['requests_per_sec']['requests_per_sec'])
+    total_data = float(fields['total_data']['total_data'])
+    data_unit = fields['total_data']['data_unit'].decode().lower()
+    response_time_25 = float(fields['response_time_25']['response_time'])
+    response_time_50 = float(fields['response_time_50']['response_time'])
+    response_time_75 = float(fields['response_time_75']['response_time'])
+    response_time_90 = float(fields['response_time_90']['response_time'])
+    response_time_99 = float(fields['response_time_99']['response_time'])
+
+    total_data = _size_in_bytes(total_data, _TEST_SIZE_UNITS.get(data_unit, 0))
 
     file_name = os.path.basename(file_path)
-    print(f"File: {file_path}")
-    print(f"Median: {int(response_time_50 * 1000)}")
-    print(f"Fastest: {int(fastest * 1000)}")
-    print(f"Slowest: {int(slowest * 1000)}")
-    print(f"Response time 25%: {int(response_time_25 * 1000)}")
-    print(f"Response time 75%: {int(response_time_75 * 1000)}")
-    print(f"Requests/sec: {float(requests_per_sec)}")
-    print(f"Total data: {int(total_data)}")
-    print(f"Total requests: {int(total_counts)}")
-    print()
+    if out is not None:
+        print(f"File: {file_path}", file=out)
+        print(f"Median: {int(response_time_50 * 1000)}", file=out)
+        print(f"Fastest: {int(fastest * 1000)}", file=out)
+        print(f"Slowest: {int(slowest * 1000)}", file=out)
+        print(f"Response time 25%: {int(response_time_25 * 1000)}", file=out)
+        print(f"Response time 75%: {int(response_time_75 * 1000)}", file=out)
+        print(f"Requests/sec: {float(requests_per_sec)}", file=out)
+        print(f"Total data: {int(total_data)}", file=out)
+        print(f"Total requests: {int(total_counts)}", file=out)
+        print(file=out)
 
     return {
         "Slowest": int(slowest * 1000),
@@ -87,55 +111,46 @@ def process_oha(file_path):
         "Total requests": int(total_counts),
     }
 
-def process_warp(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    # Regular expression patterns to find the required fields
-    requests_considered_pattern = r'Requests considered:\s+(\d+)'
-    ttfb_line_pattern = r'TTFB:.+'
-    ttfb_median_pattern = r'Median: (\d+\.?\d*)\s*(s|ms)'
-    worst_pattern = r'Worst: (\d+\.?\d*)\s*(s|ms)'
-    ttfb_99th_pattern = r'99th: (\d+\.?\d*)\s*(s|ms)'
-    ttfb_90th_pattern = r'90th: (\d+\.?\d*)\s*(s|ms)'
-    ttfb_75th_pattern = r'75th: (\d+\.?\d*)\s*(s|ms)'
-    ttfb_25th_pattern = r'25th: (\d+\.?\d*)\s*(s|ms)'
-    best_pattern = r'Best: (\d+\.?\d*)\s*(s|ms)'
-    throughput_pattern = r'Average:\s+(\d+\.\d+)\sMiB/s,\s+(\d+\.\d+)\sobj/s'
-
-    requests_considered = int(re.search(requests_considered_pattern, content).group(1))
-
-    ttfb_lines = re.findall(ttfb_line_pattern, content)
-
-    def convert_to_ms(match):
-        value, unit = match.groups()
-        if unit == 's':
+def process_warp(content, file_path, out=None):
+    requests_considered = int(_REQUESTS_CONSIDERED_RE.search(content).group(1))
+
+    ttfb_lines = _TTFB_LINE_RE.findall(content)
+
+    throughput_mib_s, throughput_obj_s = _THROUGHPUT_RE.search(content).groups()
+
+    def convert_to_ms(value, unit):
+        if unit == b's':
             return float(value) * 1000
         else:
             return float(value)
 
-    ttfb_median = convert_to_ms(re.search(ttfb_median_pattern, ttfb_lines[0]))
-    best = convert_to_ms(re.search(best_pattern, ttfb_lines[0]))
-    worst = convert_to_ms(re.search(worst_pattern, ttfb_lines[0]))
-    ttfb_25th = convert_to_ms(re.search(ttfb_25th_pattern, ttfb_lines[0]))
-    ttfb_75th = convert_to_ms(re.search(ttfb_75th_pattern, ttfb_lines[0]))
-    ttfb_90th = convert_to_ms(re.search(ttfb_90th_pattern, ttfb_lines[0]))
-    ttfb_99th = convert_to_ms(re.search(ttfb_99th_pattern, ttfb_lines[0]))
+    # Keep the first occurrence of every percentile
+    ttfb = {}
+    for name, value, unit in _TTFB_RE.findall(ttfb_lines[0]):
+        ttfb.setdefault(name.decode(), (value, unit))
+
+    ttfb_median = convert_to_ms(*ttfb['Median'])
+    best = convert_to_ms(*ttfb['Best'])
+    worst = convert_to_ms(*ttfb['Worst'])
+    ttfb_25th = convert_to_ms(*ttfb['25th'])
+    ttfb_75th = convert_to_ms(*ttfb['75th'])
+    ttfb_90th = convert_to_ms(*ttfb['90th'])
+    ttfb_99th = convert_to_ms(*ttfb['99th'])
 
-    throughput_mib_s, throughput_obj_s = re.search(throughput_pattern, content).groups()
     throughput_mib_s = float(throughput_mib_s)
     throughput_obj_s = float(throughput_obj_s)
 
-    print(f"File: {file_path}")
-    print(f"Requests considered: {requests_considered}")
-    print(f"Median: {ttfb_median:.2f} ms")
-    print(f"Best: {best:.2f} ms")
-    print(f"Worst: {worst:.2f} ms")
-    print(f"99th: {worst:.2f} ms")
-    print(f"25th: {ttfb_25th:.2f} ms")
-    print(f"75th: {ttfb_75th:.2f} ms")
-    print(f"Throughput: {throughput_mib_s:.2f} MiB/s, {throughput_obj_s:.2f} obj/s")
-    print()
+    if out is not None:
+        print(f"File: {file_path}", file=out)
+        print(f"Requests considered: {requests_considered}", file=out)
+        print(f"Median: {ttfb_median:.2f} ms", file=out)
+        print(f"Best: {best:.2f} ms", file=out)
+        print(f"Worst: {worst:.2f} ms", file=out)
+        print(f"99th: {worst:.2f} ms", file=out)
+        print(f"25th: {ttfb_25th:.2f} ms", file=out)
+        print(f"75th: {ttfb_75th:.2f} ms", file=out)
+        print(f"Throughput: {throughput_mib_s:.2f} MiB/s, {throughput_obj_s:.2f} obj/s", file=out)
+        print(file=out)
 
     return {
         "Total requests": requests_considered,
@@ -149,23 +164,32 @@ def process_warp(file_path):
         "Throughput": int(throughput_obj_s),
     }
 
-def process_iftop(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    # Regular expression pattern to find the cumulative values section
-    cumulative_pattern = r'Cumulative \(sent/received/total\):\s*([\d.]+[KMG]?B)\s+([\d.]+[KMG]?B)\s+([\d.]+[KMG]?B)'
-
-    # Find the cumulative values from the matching line
-    cumulative_values_match = re.findall(cumulative_pattern, content)[-1]
-
-    sent_cumulative, received_cumulative, total_cumulative = cumulative_values_match
-
-    print(f"File: {file_path}")
-    print(f"Cumulative Sent: {sent_cumulative}")
-    print(f"Cumulative Received: {received_cumulative}")
-    print(f"Cumulative Total: {total_cumulative}")
-    print()
+def process_iftop(content, file_path, out=None):
+    # Find the cumulative values from the last matching line, searching
+    # backwards for the literal prefix and only running the regex there.
+    # As the search starts at the end of the memory-mapped file, only its
+    # tail up to the last match is paged in, like with `tail`
+    end = len(content)
+    while True:
+        start = content.rfind(b'Cumulative (', 0, end)
+        if start == -1:
+            raise ValueError(f"No cumulative values found in {file_path}")
+
+        cumulative_values_match = _CUMULATIVE_RE.match(content, start)
+        if cumulative_values_match:
+            break
+        end = start
+
+    cumulative_values = [value.decode() for value in cumulative_values_match.groups()]
+
+    sent_cumulative, received_cumulative, total_cumulative = cumulative_values
+
+    if out is not None:
+        print(f"File: {file_path}", file=out)
+        print(f"Cumulative Sent: {sent_cumulative}", file=out)
+        print(f"Cumulative Received: {received_cumulative}", file=out)
+        print(f"Cumulative Total: {total_cumulative}", file=out)
+        print(file=out)
     
     sent_cumulative = get_data_size_in_bytes(sent_cumulative)
     received_cumulative = get_data_size_in_bytes(received_cumulative)
@@ -179,88 +203,67 @@ def process_iftop(file_path):
 
 
 def parse_test_size_suffix(file_name):
-    # Regular expression pattern to find the size suffix (e.g., "1KiB", "10KiB", "1MiB")
-    size_pattern = r'([\d.]+)([KMGTP]iB)'
-
-    match = re.search(size_pattern, file_name)
-    if match:
-        size_value, size_unit = match.groups()
-        size_value = float(size_value)
-        size_unit = size_unit.lower()
-
-        return size_value, size_unit
+    # Find the size suffix (e.g., "1KiB", "10KiB", "1MiB") and the number in front of it
+    end = file_name.find('iB', 1)
+    while end != -1:
+        unit_start = end - 1
+        start = unit_start
+        while start > 0 and file_name[start - 1] in _SIZE_VALUE_CHARS:
+            start -= 1
+
+        if file_name[unit_start] in 'KMGTP' and start < unit_start:
+            size_value = float(file_name[start:unit_start])
+            size_unit = file_name[unit_start:end + 2].lower()
+
+            return size_value, size_unit
+        end = file_name.find('iB', end + 2)
     return 0, "b"
 
+def _size_in_bytes(size_value, unit_idx):
+    return int(size_value * _SIZE_MULTIPLIERS[unit_idx])
+
 def get_test_size_in_bytes(file_name):
     size_value, size_unit = parse_test_size_suffix(file_name)
-    size_value = float(size_value)
-    size_unit = size_unit.lower()
-
-    if size_unit == 'kib':
-        return int(size_value * 1024)
-    elif size_unit == 'mib':
-        return int(size_value * 1024 ** 2)
-    elif size_unit == 'gib':
-        return int(size_value * 1024 ** 3)
-    elif size_unit == 'tib':
-        return int(size_value * 1024 ** 4)
-    elif size_unit == 'pib':
-        return int(size_value * 1024 ** 5)
 
-    # If no size suffix found or unsupported unit, return 0
-    return 0
+    unit_idx = _TEST_SIZE_UNITS.get(size_unit)
+    if unit_idx is None:
+        # If no size suffix found or unsupported unit, return 0
+        return 0
+    return _size_in_bytes(size_value, unit_idx)
 
 def get_data_size_in_bytes(file_name):
-    # Regular expression pattern to find the size suffix (e.g., "1KB", "10KB", "1MB")
-    size_pattern = r'([\d.]+)([KMGTP]B)'
-
-    match = re.search(size_pattern, file_name)
-    if match:
-        size_value, size_unit = match.groups()
-        size_value = float(size_value)
-        size_unit = size_unit.lower()
-
-        if size_unit == 'kb':
-            return int(size_value * 1024)
-        elif size_unit == 'mb':
-            return int(size_value * 1024 ** 2)
-        elif size_unit == 'gb':
-            return int(size_value * 1024 ** 3)
-        elif size_unit == 'tb':
-            return int(size_value * 1024 ** 4)
-        elif size_unit == 'pb':
-            return int(size_value * 1024 ** 5)
-
-        
+    # Strip the size suffix (e.g., "1KB", "10KB", "1MB") and scale the number in front of it
+    size = file_name.lower()
+    for size_unit, unit_idx in _DATA_SIZE_UNITS.items():
+        if size.endswith(size_unit):
+            try:
+                return _size_in_bytes(float(size[:-len(size_unit)]), unit_idx)
+            except ValueError:
+                break
 
     # If no size suffix found or unsupported unit, return 0
     return 0
 
 def get_file_type(file_name):
-    if file_name.startswith("warp"):
-        return 1, "warp"
-    if file_name.startswith("iftop-warp"):
-        return 2, "iftop-warp"
-    if file_name.startswith("oha"):
-        return 3, "oha"
-    if file_name.startswith("iftop-oha"):
-        return 4, "iftop-oha"
-    return 0, ""
+    # The type is the tool name in front of the test size (e.g., "warp-1KiB.txt"),
+    # prefixed with "iftop-" for the network captures (e.g., "iftop-warp-1KiB.txt")
+    tool, _, rest = file_name.partition('-')
+    if tool == "iftop":
+        tool = f"iftop-{rest.partition('-')[0]}"
+    return _FILE_TYPES.get(tool, (0, ""))
 
 def write_to_spreadsheet(data_dict, output_file):
-    # Create an empty DataFrame to store the data
-    df = pd.DataFrame()
-
-    # Flatten the nested dictionary and add the values to the DataFrame
+    # Flatten the nested dictionary into rows, keeping the order in which
+    # the rows and columns first appear
+    records = {}
+    columns = {}
     for tool, sizes in data_dict.items():
         for size, values in sizes.items():
+            column_name = f"{size}"
+            columns[column_name] = None
             for metric, value in values.items():
                 row_name = f"{tool} {metric}"
-                column_name = f"{size}"
-                df.loc[row_name, column_name] = value
-
-    # Insert an empty column to the right
-    df[""] = ""
+                records.setdefault(row_name, {})[column_name] = value
 
     # Add the "Units" column with the specified values
     units = [
@@ -292,39 +295,66 @@ def write_to_spreadsheet(data_dict, output_file):
         "B",
         "B",
     ]
-    df["Units"] = units
 
-    # Write the DataFrame to a spreadsheet
-    df.to_excel(output_file)
+    # Build the sheet row by row, with an empty column between the values
+    # and the "Units" column
+    sheet = [["", *columns, "", "Units"]]
+    for (row_name, values), unit in zip(records.items(), units):
+        sheet.append([row_name, *(values.get(column_name, "") for column_name in columns), "", unit])
+
+    # Write the rows to a spreadsheet
+    save_data(output_file, {"Sheet1": sheet})
+
+def _parse_one(file_path, type_id, verbose):
+    # Buffer the report of the parser instead of printing it directly
+    out = io.StringIO() if verbose else None
+
+    # Map the file once and hand the contents to the parser for its type
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        if type_id == 1:
+            r = process_warp(content, file_path, out)
+        elif type_id == 3:
+            r = process_oha(content, file_path, out)
+        else:
+            r = process_iftop(content, file_path, out)
+
+    return r, out.getvalue() if verbose else ""
 
-def parse_files_in_directory(directory_path):
+def parse_files_in_directory(directory_path, verbose=False):
     # Get a list of files in the directory
-    file_list = os.listdir(directory_path)
+    with os.scandir(directory_path) as entries:
+        file_list = [entry for entry in entries if entry.is_file()]
+
+    # Determine the size and type of every file once and sort the files
+    # based on the indicated size in ascending order
+    decorated = [(get_test_size_in_bytes(entry.name), get_file_type(entry.name), entry) for entry in file_list]
+    decorated.sort(key=lambda item: (item[0], item[1][0]))
+
+    # Collect the files of a known type
+    tasks = []
+    for _, (type_id, test_type), entry in decorated:
+        if type_id == 0:
+            continue
 
-    # Sort the files based on the indicated size in ascending order
-    file_list.sort(key=lambda file_name: (get_test_size_in_bytes(file_name), get_file_type(file_name)[0]) )
+        size, unit = parse_test_size_suffix(entry.name)
+        test_size = f"{int(size)}{unit}"
+        tasks.append((type_id, test_type, test_size, entry.path))
 
     results = {}
+    reports = []
 
-    for file in file_list:
-        file_path = os.path.join(directory_path, file)
-        
-        if not os.path.isfile(file_path):
-            continue
+    # Parse the files in parallel, collecting the results in sorted order
+    with ProcessPoolExecutor() as executor:
+        parsed = executor.map(_parse_one, [task[3] for task in tasks], [task[0] for task in tasks], itertools.repeat(verbose))
 
-        size, unit = parse_test_size_suffix(file)
-        test_size = f"{int(size)}{unit}"
-        test_type = get_file_type(file)[1]
-
-        if file.startswith("warp"):
-            r = process_warp(file_path)
-        if file.startswith("oha"):
-            r = process_oha(file_path)
-        if file.startswith("iftop"):
-            r = process_iftop(file_path)
+        for (_, test_type, test_size, _), (r, report) in zip(tasks, parsed):
+            results[test_type] = results.get(test_type, {})
+            results[test_type][test_size] = r
+            reports.append(report)
 
-        results[test_type] = results.get(test_type, {})
-        results[test_type][test_size] = r
+    # Write the reports of all files at once
+    if verbose:
+        sys.stdout.write("".join(reports))
 
     results["calc"] = {}
 
@@ -341,14 +371,14 @@ def parse_files_in_directory(directory_path):
         results["calc"][size]["warp Avg B/Req"] = warp_data // warp_req
         results["calc"][size]["oha Avg B/Req"] = oha_data // oha_req
 
-    # pp.pprint(results)
     test_name = os.path.basename(directory_path)
     write_to_spreadsheet(results, f"{test_name}-output.ods")
     
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <directory_path>")
-    else:
-        directory_path = sys.argv[1]
-        parse_files_in_directory(directory_path)
+    parser = argparse.ArgumentParser(description="Gather the data from all collected outputs in a .ods file")
+    parser.add_argument("directory_path")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the values parsed from every file")
+    args = parser.parse_args()
+
+    parse_files_in_directory(args.directory_path, args.verbose)